@@ -6,23 +6,37 @@ PaddleOCR Web Service
 適用於 Proxmox VE Ubuntu CT 環境部署
 """
 
+import io
 import os
+import re
+import csv
 import uuid
 import json
-import tempfile
+import asyncio
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, List, Dict, Any
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request, BackgroundTasks
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import ORJSONResponse, HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+import aiofiles
+import numpy as np
 import uvicorn
 
+# 內容雜湊使用 blake3 (SIMD 最佳化)，未安裝時退回 hashlib 的 BLAKE2
+try:
+    from blake3 import blake3 as _new_content_hash
+except ImportError:
+    from hashlib import blake2b as _new_content_hash
+
 # 設定日誌
 logging.basicConfig(
     level=logging.INFO,
@@ -36,7 +50,9 @@ app = FastAPI(
     description="基於 PaddleOCR 的文字辨識 API 服務，支援圖片與 PDF 檔案",
     version="1.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    # orjson 在 C 層序列化巢狀座標陣列，大量辨識結果時明顯快於標準 json
+    default_response_class=ORJSONResponse
 )
 
 # CORS 設定
@@ -58,25 +74,72 @@ UPLOAD_DIR = BASE_DIR / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True)
 
 # 允許的檔案類型
-ALLOWED_IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp', '.tiff', '.tif'}
-ALLOWED_PDF_EXTENSIONS = {'.pdf'}
+ALLOWED_IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp', '.tiff', '.tif'})
+ALLOWED_PDF_EXTENSIONS = frozenset({'.pdf'})
 ALLOWED_EXTENSIONS = ALLOWED_IMAGE_EXTENSIONS | ALLOWED_PDF_EXTENSIONS
 
+# 預先組好錯誤訊息中的支援格式列表
+_SUPPORTED_FORMATS_MSG = ', '.join(sorted(ALLOWED_EXTENSIONS))
+
 # OCR 引擎 (延遲載入)
 _ocr_engine = None
 _structure_engine = None
 
 def get_ocr_engine():
-    """取得或初始化 OCR 引擎"""
+    """取得或初始化 OCR 引擎
+
+    設定 OCR_USE_ONNX=1 並以 OCR_DET_MODEL_DIR / OCR_REC_MODEL_DIR 指向
+    paddlex --paddle2onnx 轉換出的模型目錄，可改用 ONNX Runtime 後端
+    加速推論 (需安裝 PaddleX 高效能推論外掛)
+    """
     global _ocr_engine
     if _ocr_engine is None:
         logger.info("初始化 PaddleOCR 引擎...")
         from paddleocr import PaddleOCR
-        _ocr_engine = PaddleOCR(
+        # 辨識批次設為 1: CPU 推論不會在批次內平行化，預設值只是放大
+        # 記憶體 arena；批次吞吐由上層的動態批次佇列負責。
+        # cpu_threads 尊重 OMP_NUM_THREADS 上限 (多行程模式會設定它)，
+        # 否則 Paddle 會在執行期覆寫該環境變數造成核心超額訂閱
+        kwargs = dict(
             use_doc_orientation_classify=False,
             use_doc_unwarping=False,
             use_textline_orientation=False,
+            text_recognition_batch_size=1,
+            cpu_threads=int(os.environ.get("OMP_NUM_THREADS", os.cpu_count() or 1)),
+            enable_mkldnn=True,
         )
+        if os.environ.get("OCR_USE_BF16") == "1":
+            # 辨識器在 CPU 上受記憶體頻寬限制，BF16 權重可減半頻寬需求
+            # (需 Cooper Lake 之後支援 BF16 的 CPU)
+            try:
+                import paddle
+                paddle.set_flags({
+                    'FLAGS_use_mkldnn': True,
+                    'FLAGS_use_mkldnn_bfloat16': True,
+                })
+                logger.info("啟用 MKL-DNN BF16 推論")
+            except Exception as e:
+                logger.warning(f"啟用 BF16 失敗: {e}")
+        if os.environ.get("OCR_USE_ONNX") == "1":
+            det_dir = os.environ.get("OCR_DET_MODEL_DIR")
+            rec_dir = os.environ.get("OCR_REC_MODEL_DIR")
+            if not det_dir or not rec_dir:
+                raise RuntimeError(
+                    "OCR_USE_ONNX=1 需要同時設定 OCR_DET_MODEL_DIR 與 OCR_REC_MODEL_DIR"
+                )
+            # 3.x 沒有 use_onnx 參數，改經高效能推論外掛 (enable_hpi)
+            # 使用 ONNX Runtime 後端。外掛需另行安裝:
+            #   paddlex --install hpi-cpu   (GPU 環境改用 hpi-gpu)
+            # 模型需以 paddlex 轉換，會一併產生 inference.onnx 與
+            # 模型設定檔 (裸 paddle2onnx 輸出缺少設定檔，無法載入):
+            #   paddlex --paddle2onnx --paddle_model_dir <模型目錄> --onnx_model_dir <輸出目錄>
+            kwargs.update(
+                enable_hpi=True,
+                text_detection_model_dir=det_dir,
+                text_recognition_model_dir=rec_dir,
+            )
+            logger.info("使用 ONNX Runtime 後端 (高效能推論)")
+        _ocr_engine = PaddleOCR(**kwargs)
         logger.info("PaddleOCR 引擎初始化完成")
     return _ocr_engine
 
@@ -142,92 +205,227 @@ def validate_file(filename: str) -> tuple[bool, str]:
     """驗證上傳的檔案"""
     if not filename:
         return False, "未提供檔案名稱"
-    
-    ext = Path(filename).suffix.lower()
+
+    # 直接切出副檔名，避免每個請求建立 Path 物件；與 Path.suffix 一致，
+    # 開頭的點 (如 ".pdf") 或結尾的點 (如 "file.") 都視為無副檔名
+    dot = filename.rfind('.')
+    ext = filename[dot:].lower() if 0 < dot < len(filename) - 1 else ''
     if ext not in ALLOWED_EXTENSIONS:
-        return False, f"不支援的檔案格式: {ext}。支援格式: {', '.join(ALLOWED_EXTENSIONS)}"
-    
+        return False, f"不支援的檔案格式: {ext}。支援格式: {_SUPPORTED_FORMATS_MSG}"
+
     return True, ext
 
-def process_image_ocr(image_path: str) -> List[Dict[str, Any]]:
-    """處理圖片 OCR"""
-    ocr = get_ocr_engine()
-    result = ocr.predict(input=image_path)
-    
+# 快取的結果擷取函式，於第一次辨識時依結果格式決定
+_extract = None
+
+def _resolve_extractor(res):
+    """偵測 OCR 結果的格式，回傳直接讀取對應欄位的擷取函式
+
+    PaddleOCR 不同版本的結果物件欄位不同，只在第一次辨識時探測一次，
+    之後每次呼叫都走快取的直接路徑，避免反覆反射
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"OCR result type: {type(res)}, attributes: {dir(res)}")
+
+    # 方式 1: rec_texts 屬性 (PaddleOCR 3.x)
+    if hasattr(res, 'rec_texts'):
+        return lambda r: (
+            r.rec_texts,
+            getattr(r, 'rec_scores', None),
+            getattr(r, 'dt_polys', None),
+        )
+
+    # 方式 2: 直接訪問 text 屬性
+    if hasattr(res, 'text'):
+        return lambda r: (
+            [r.text] if isinstance(r.text, str) else r.text,
+            [getattr(r, 'score', 1.0)],
+            [getattr(r, 'box', [])],
+        )
+
+    # 方式 3: 字典格式
+    if isinstance(res, dict):
+        if 'rec_texts' in res:
+            return lambda r: (r['rec_texts'], r.get('rec_scores'), r.get('dt_polys'))
+        if 'text' in res:
+            return lambda r: ([r['text']], [r.get('score', 1.0)], [r.get('box', [])])
+
+    # 方式 4: 嘗試 __dict__
+    if hasattr(res, '__dict__') and 'rec_texts' in res.__dict__:
+        return lambda r: (
+            r.__dict__['rec_texts'],
+            r.__dict__.get('rec_scores'),
+            r.__dict__.get('dt_polys'),
+        )
+
+    # 無法辨認的格式
+    return lambda r: (None, None, None)
+
+def _extract_ocr_results(res) -> List[Dict[str, Any]]:
+    """從單一 PaddleOCR 結果物件擷取文字、信心度與座標"""
+    global _extract
+    if _extract is None:
+        _extract = _resolve_extractor(res)
+
+    texts, scores, boxes = _extract(res)
     ocr_results = []
-    
-    # PaddleOCR 3.x 返回格式處理
-    for res in result:
-        # 調試：記錄返回的屬性
-        logger.info(f"OCR result type: {type(res)}, attributes: {dir(res)}")
-        
-        # 嘗試不同的屬性名稱 (PaddleOCR 3.x)
-        texts = None
-        scores = None
-        boxes = None
-        
-        # 方式 1: rec_texts (PaddleOCR 3.x)
-        if hasattr(res, 'rec_texts'):
-            texts = res.rec_texts
-            scores = getattr(res, 'rec_scores', [1.0] * len(texts))
-            boxes = getattr(res, 'dt_polys', [[]] * len(texts))
-        
-        # 方式 2: 直接訪問 text 屬性
-        elif hasattr(res, 'text'):
-            texts = [res.text] if isinstance(res.text, str) else res.text
-            scores = [getattr(res, 'score', 1.0)]
-            boxes = [getattr(res, 'box', [])]
-        
-        # 方式 3: 字典格式
-        elif isinstance(res, dict):
-            if 'rec_texts' in res:
-                texts = res['rec_texts']
-                scores = res.get('rec_scores', [1.0] * len(texts))
-                boxes = res.get('dt_polys', [[]] * len(texts))
-            elif 'text' in res:
-                texts = [res['text']]
-                scores = [res.get('score', 1.0)]
-                boxes = [res.get('box', [])]
-        
-        # 方式 4: 嘗試 json() 方法
-        elif hasattr(res, 'json'):
+
+    # 處理找到的結果
+    if texts:
+        # 一次性在 C 層轉換整個陣列，避免逐筆 tolist()/float() 呼叫
+        if scores is None:
+            confs = [1.0] * len(texts)
+        else:
+            confs = np.asarray(scores, dtype=np.float32).tolist()
+        if boxes is None or len(boxes) == 0:
+            polys = [[]] * len(texts)
+        else:
             try:
-                data = res.json()
-                logger.info(f"OCR result json: {data}")
-            except:
-                pass
-        
-        # 方式 5: 嘗試 __dict__
-        if texts is None and hasattr(res, '__dict__'):
-            logger.info(f"OCR result __dict__: {res.__dict__}")
-            d = res.__dict__
-            if 'rec_texts' in d:
-                texts = d['rec_texts']
-                scores = d.get('rec_scores', [1.0] * len(texts))
-                boxes = d.get('dt_polys', [[]] * len(texts))
-        
-        # 處理找到的結果
-        if texts:
-            for i, text in enumerate(texts):
-                if text:  # 過濾空文字
-                    score = scores[i] if i < len(scores) else 1.0
-                    bbox = boxes[i] if i < len(boxes) else []
-                    ocr_results.append({
-                        'text': str(text),
-                        'confidence': float(score) if score else 1.0,
-                        'bbox': bbox.tolist() if hasattr(bbox, 'tolist') else (list(bbox) if bbox else [])
-                    })
-    
+                polys = np.asarray(boxes).tolist()
+            except ValueError:
+                # 各框點數不一致時退回逐框轉換
+                polys = [np.asarray(b).tolist() for b in boxes]
+
+        for text, conf, poly in zip(texts, confs, polys):
+            if text:  # 過濾空文字
+                ocr_results.append({
+                    'text': text,
+                    'confidence': conf,
+                    'bbox': poly
+                })
+
+    return ocr_results
+
+async def _ocr_batch_worker():
+    """背景批次工作: 收集佇列中的待辨識圖片，湊滿批次後一次送入引擎
+
+    等待期間最多累積 OCR_MAX_BATCH 張圖片或 OCR_BATCH_WAIT 秒，
+    再以單次 ocr.predict 呼叫處理整個批次，攤平每張圖片的推論成本
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _ocr_request_queue.get()]
+        while len(batch) < OCR_MAX_BATCH:
+            try:
+                batch.append(await asyncio.wait_for(
+                    _ocr_request_queue.get(), timeout=OCR_BATCH_WAIT
+                ))
+            except asyncio.TimeoutError:
+                break
+
+        # 整個批次流程都在例外保護內，確保工作本身不會因單一批次
+        # 失敗而終止，留下永遠等不到結果的呼叫端
+        error = None
+        try:
+            inputs = [image for image, _ in batch]
+            result = await loop.run_in_executor(
+                _EXECUTOR, lambda: get_ocr_engine().predict(input=inputs)
+            )
+            for (_, future), res in zip(batch, result):
+                if not future.done():
+                    future.set_result(_extract_ocr_results(res))
+        except Exception as e:
+            logger.error(f"OCR 批次處理失敗: {e}")
+            error = e
+
+        # 批次失敗或引擎回傳數量少於輸入時，未解決的 future 一律以
+        # 例外收尾，避免呼叫端無限期等待
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(
+                    error if error is not None
+                    else RuntimeError("OCR 引擎未回傳此圖片的結果")
+                )
+
+async def _submit_ocr(image) -> List[Dict[str, Any]]:
+    """將單張圖片 (檔案路徑或 NumPy 陣列) 送入批次佇列並等待結果"""
+    if _ocr_request_queue is None:
+        # 批次工作尚未啟動 (例如直接呼叫)，退回單張辨識
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            _EXECUTOR, lambda: get_ocr_engine().predict(input=image)
+        )
+        ocr_results = [r for res in result for r in _extract_ocr_results(res)]
+    else:
+        future = asyncio.get_running_loop().create_future()
+        await _ocr_request_queue.put((image, future))
+        ocr_results = await future
+
     logger.info(f"OCR 辨識完成，共 {len(ocr_results)} 個結果")
     return ocr_results
 
-def process_pdf_ocr(pdf_path: str) -> List[Dict[str, Any]]:
-    """處理 PDF OCR"""
+async def process_image_ocr(image_path: str) -> List[Dict[str, Any]]:
+    """處理圖片 OCR (經由批次佇列送入共用引擎)"""
+    return await _submit_ocr(image_path)
+
+async def process_image_ocr_array(image: np.ndarray) -> List[Dict[str, Any]]:
+    """處理已解碼為 NumPy 陣列的圖片 OCR，免去暫存檔與 PNG 編解碼"""
+    return await _submit_ocr(image)
+
+# PDF 管線各階段間的佇列大小上限，避免渲染速度快於 OCR 時堆積過多頁面
+PDF_PIPELINE_QUEUE_SIZE = 4
+
+# PDF 渲染倍率 (2 約等於 144 DPI)
+PDF_RENDER_SCALE = 2
+
+# 批次端點同時處理的檔案數上限
+BATCH_CONCURRENCY = 4
+
+# OCR 推論與 PDF 渲染專用的執行緒池，與事件迴圈的預設池分離，
+# 避免推論任務與檔案 I/O 互相排隊
+_EXECUTOR = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="ocr")
+
+# 上傳檔案串流寫入的分塊大小 (1 MiB)
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# 表格解析用: 兩個以上連續空白 (不含換行) 視為欄位分隔
+_RE_MULTISPACE = re.compile(r'[^\S\n]{2,}')
+
+# OCR 結果快取 (LRU)，讓重複上傳免除整次推論。鍵為 (處理路徑, 內容雜湊)，
+# 同樣的位元組以不同副檔名上傳時不會誤用另一條路徑的結果
+RESULT_CACHE_SIZE = 512
+_result_cache: OrderedDict = OrderedDict()
+
+def _cache_key(file_type: str, digest: str) -> str:
+    """組合結果快取的鍵"""
+    return f"{file_type}:{digest}"
+
+def _cache_get(key: str) -> Optional[List[Dict[str, Any]]]:
+    """查詢結果快取並更新 LRU 順序"""
+    results = _result_cache.get(key)
+    if results is not None:
+        _result_cache.move_to_end(key)
+    return results
+
+def _cache_put(key: str, results: List[Dict[str, Any]]):
+    """寫入結果快取，超出容量時淘汰最久未使用的項目"""
+    _result_cache[key] = results
+    _result_cache.move_to_end(key)
+    if len(_result_cache) > RESULT_CACHE_SIZE:
+        _result_cache.popitem(last=False)
+
+# 動態批次設定: 最多累積幾張圖片、等待多久後送入引擎
+OCR_MAX_BATCH = 8
+OCR_BATCH_WAIT = 0.025  # 秒
+
+# 待辨識圖片佇列與背景批次工作 (於 startup 時建立)
+_ocr_request_queue: Optional[asyncio.Queue] = None
+_ocr_batch_task = None
+
+async def process_pdf_ocr(pdf_path: str) -> List[Dict[str, Any]]:
+    """處理 PDF OCR
+
+    以三階段管線 (渲染 → 轉陣列 → OCR) 並行處理各頁面，
+    讓 CPU 渲染與模型推論互相重疊，提升多頁 PDF 的吞吐量
+    """
     structure = get_structure_engine()
-    
+    loop = asyncio.get_running_loop()
+
     if structure and structure is not False:
         # 使用 PP-StructureV3 處理 PDF
-        result = structure.predict(input=pdf_path)
+        result = await loop.run_in_executor(
+            _EXECUTOR, lambda: structure.predict(input=pdf_path)
+        )
         ocr_results = []
         for res in result:
             if hasattr(res, 'text_contents'):
@@ -238,31 +436,125 @@ def process_pdf_ocr(pdf_path: str) -> List[Dict[str, Any]]:
                         'bbox': []
                     })
         return ocr_results
-    else:
-        # 將 PDF 轉換為圖片後處理
-        try:
-            import pdf2image
-            images = pdf2image.convert_from_path(pdf_path)
-            all_results = []
-            
-            for i, img in enumerate(images):
-                with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
-                    img.save(tmp.name)
-                    page_results = process_image_ocr(tmp.name)
-                    for r in page_results:
-                        r['page'] = i + 1
-                    all_results.extend(page_results)
-                    os.unlink(tmp.name)
-            
-            return all_results
-        except ImportError:
-            raise HTTPException(
-                status_code=500, 
-                detail="PDF 處理需要安裝 pdf2image 和 poppler-utils"
+
+    # 將 PDF 逐頁轉換為圖片後處理
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        raise HTTPException(
+            status_code=500,
+            detail="PDF 處理需要安裝 PyMuPDF"
+        )
+
+    doc = await loop.run_in_executor(_EXECUTOR, fitz.open, pdf_path)
+
+    # PyMuPDF 非執行緒安全: 渲染與 close 都必須在鎖內執行，
+    # 避免取消管線後 doc.close() 與仍在執行緒池中的渲染競爭
+    doc_lock = threading.Lock()
+
+    render_queue: asyncio.Queue = asyncio.Queue(maxsize=PDF_PIPELINE_QUEUE_SIZE)
+    ocr_queue: asyncio.Queue = asyncio.Queue(maxsize=PDF_PIPELINE_QUEUE_SIZE)
+
+    async def render_pages():
+        """第一階段: 以 PyMuPDF 在行程內逐頁渲染，直接取得像素緩衝"""
+        matrix = fitz.Matrix(PDF_RENDER_SCALE, PDF_RENDER_SCALE)
+
+        def render_one(p):
+            with doc_lock:
+                return doc[p - 1].get_pixmap(matrix=matrix, alpha=False)
+
+        for page_num in range(1, doc.page_count + 1):
+            pix = await loop.run_in_executor(_EXECUTOR, render_one, page_num)
+            arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(
+                pix.height, pix.width, pix.n
             )
+            await render_queue.put((page_num, arr))
+        await render_queue.put(None)
+
+    async def convert_pages():
+        """第二階段: 調整通道順序，PyMuPDF 輸出 RGB 而 PaddleOCR 預期 BGR"""
+        while True:
+            item = await render_queue.get()
+            if item is None:
+                await ocr_queue.put(None)
+                break
+            page_num, img = item
+            arr = np.ascontiguousarray(img[:, :, ::-1])
+            await ocr_queue.put((page_num, arr))
+
+    async def ocr_pages():
+        """第三階段: 對每頁執行 OCR 並收集結果"""
+        all_results = []
+        while True:
+            item = await ocr_queue.get()
+            if item is None:
+                break
+            page_num, arr = item
+            page_results = await process_image_ocr_array(arr)
+            for r in page_results:
+                r['page'] = page_num
+            all_results.extend(page_results)
+        return all_results
+
+    stage_tasks = [
+        asyncio.create_task(render_pages()),
+        asyncio.create_task(convert_pages()),
+        asyncio.create_task(ocr_pages()),
+    ]
+    try:
+        _, _, all_results = await asyncio.gather(*stage_tasks)
+    finally:
+        # 任一階段失敗時取消其餘階段，否則它們會卡在有界佇列上
+        # (等不到結束哨兵)。取消只會中斷 await 點，已送入執行緒池的
+        # 渲染仍會繼續，因此 close 也進執行緒池並透過 doc_lock 排在
+        # 最後一次渲染之後
+        for task in stage_tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*stage_tasks, return_exceptions=True)
+
+        def close_doc():
+            with doc_lock:
+                doc.close()
+        await loop.run_in_executor(_EXECUTOR, close_doc)
+    return all_results
 
 # ============== API Routes ==============
 
+@app.on_event("startup")
+async def start_ocr_batch_worker():
+    """啟動 OCR 批次佇列與背景工作"""
+    global _ocr_request_queue, _ocr_batch_task
+    _ocr_request_queue = asyncio.Queue()
+    _ocr_batch_task = asyncio.create_task(_ocr_batch_worker())
+
+@app.on_event("startup")
+async def warmup_engines():
+    """預熱 OCR 引擎: 於背景載入模型並執行一次推論
+
+    首次推論會觸發 Paddle 的核心編譯，耗時可達數十秒；
+    在啟動階段先完成，避免第一個請求承擔冷啟動延遲
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        dummy = np.zeros((640, 640, 3), dtype=np.uint8)
+        await loop.run_in_executor(
+            _EXECUTOR, lambda: get_ocr_engine().predict(input=dummy)
+        )
+        logger.info("OCR 引擎預熱完成")
+    except Exception as e:
+        logger.warning(f"OCR 引擎預熱失敗: {e}")
+    try:
+        await loop.run_in_executor(_EXECUTOR, get_structure_engine)
+    except Exception as e:
+        logger.warning(f"PP-StructureV3 引擎預熱失敗: {e}")
+
+@app.on_event("shutdown")
+async def stop_ocr_batch_worker():
+    """停止背景批次工作"""
+    if _ocr_batch_task is not None:
+        _ocr_batch_task.cancel()
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """首頁 - 網頁介面"""
@@ -285,85 +577,102 @@ async def health_check():
         timestamp=datetime.now().isoformat()
     )
 
-@app.post("/api/ocr", response_model=OCRResponse)
-async def ocr_recognize(
-    file: UploadFile = File(..., description="上傳圖片或 PDF 檔案"),
-    output_format: str = Form(default="json", description="輸出格式: json, text, markdown")
-):
+async def save_upload_streaming(upload: UploadFile, ext: str) -> tuple[Path, str]:
+    """將上傳檔案分塊串流寫入暫存檔，回傳檔案路徑與內容雜湊
+
+    逐塊寫入並同步累計雜湊，峰值記憶體只有單一分塊而非整個檔案
     """
-    OCR 文字辨識 API
-    
-    支援格式:
-    - 圖片: PNG, JPG, JPEG, BMP, GIF, WebP, TIFF
-    - 文件: PDF
-    
-    回傳辨識結果，包含文字內容、信心度與座標位置
+    temp_path = UPLOAD_DIR / f"{uuid.uuid4()}{ext}"
+    hasher = _new_content_hash()
+    try:
+        async with aiofiles.open(temp_path, 'wb') as f:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                hasher.update(chunk)
+                await f.write(chunk)
+    except Exception:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return temp_path, hasher.hexdigest()
+
+async def _do_ocr_upload(file: UploadFile, background_tasks: BackgroundTasks) -> Dict[str, Any]:
+    """執行完整的上傳 → OCR 流程，回傳可直接序列化的回應 payload
+
+    批次端點直接使用此 payload，免去逐檔案的 pydantic 模型建構
+    與遞迴 .dict() 序列化
     """
     start_time = datetime.now()
-    
+
     # 驗證檔案
     valid, result = validate_file(file.filename)
     if not valid:
         raise HTTPException(status_code=400, detail=result)
-    
+
     file_ext = result
-    
+
     # 儲存上傳的檔案
-    file_id = str(uuid.uuid4())
-    temp_path = UPLOAD_DIR / f"{file_id}{file_ext}"
-    
+    temp_path, digest = await save_upload_streaming(file, file_ext)
+
     try:
-        # 寫入檔案
-        content = await file.read()
-        with open(temp_path, 'wb') as f:
-            f.write(content)
-        
         logger.info(f"處理檔案: {file.filename} ({file_ext})")
-        
-        # 執行 OCR
-        if file_ext in ALLOWED_PDF_EXTENSIONS:
-            ocr_results = process_pdf_ocr(str(temp_path))
-            file_type = "pdf"
+
+        # 執行 OCR (相同內容且相同處理路徑的重複上傳直接取用快取結果)
+        file_type = "pdf" if file_ext in ALLOWED_PDF_EXTENSIONS else "image"
+        cache_key = _cache_key(file_type, digest)
+        ocr_results = _cache_get(cache_key)
+        if ocr_results is None:
+            if file_type == "pdf":
+                ocr_results = await process_pdf_ocr(str(temp_path))
+            else:
+                ocr_results = await process_image_ocr(str(temp_path))
+            _cache_put(cache_key, ocr_results)
         else:
-            ocr_results = process_image_ocr(str(temp_path))
-            file_type = "image"
-        
-        # 組合完整文字
-        full_text = '\n'.join([r['text'] for r in ocr_results])
+            logger.info(f"內容雜湊命中快取，跳過 OCR: {file.filename}")
         
+        # 組合完整文字 (結果本身即為可序列化的 dict)
+        full_text = '\n'.join(r['text'] for r in ocr_results)
+
         # 計算處理時間
         processing_time = (datetime.now() - start_time).total_seconds()
-        
-        # 建立回應
-        results = [
-            OCRResult(
-                text=r['text'],
-                confidence=r['confidence'],
-                bbox=r.get('bbox', [])
-            ) for r in ocr_results
-        ]
-        
-        return OCRResponse(
-            success=True,
-            filename=file.filename,
-            file_type=file_type,
-            results=results,
-            full_text=full_text,
-            processing_time=processing_time,
-            timestamp=datetime.now().isoformat()
-        )
-        
+
+        # 回應送出後才在背景清理暫存檔，不佔用請求延遲
+        background_tasks.add_task(temp_path.unlink, missing_ok=True)
+
+        return {
+            'success': True,
+            'filename': file.filename,
+            'file_type': file_type,
+            'results': ocr_results,
+            'full_text': full_text,
+            'processing_time': processing_time,
+            'timestamp': datetime.now().isoformat()
+        }
+
     except Exception as e:
         logger.error(f"OCR 處理錯誤: {str(e)}")
+        temp_path.unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=f"OCR 處理失敗: {str(e)}")
-    
-    finally:
-        # 清理暫存檔案
-        if temp_path.exists():
-            temp_path.unlink()
+
+@app.post("/api/ocr", response_model=OCRResponse)
+async def ocr_recognize(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(..., description="上傳圖片或 PDF 檔案"),
+    output_format: str = Form(default="json", description="輸出格式: json, text, markdown")
+):
+    """
+    OCR 文字辨識 API
+
+    支援格式:
+    - 圖片: PNG, JPG, JPEG, BMP, GIF, WebP, TIFF
+    - 文件: PDF
+
+    回傳辨識結果，包含文字內容、信心度與座標位置
+    """
+    payload = await _do_ocr_upload(file, background_tasks)
+    return OCRResponse(**payload)
 
 @app.post("/api/ocr/batch")
 async def ocr_batch(
+    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(..., description="批次上傳多個檔案")
 ):
     """
@@ -371,29 +680,34 @@ async def ocr_batch(
     
     同時處理多個檔案，回傳所有結果
     """
-    results = []
-    
-    for file in files:
-        try:
-            result = await ocr_recognize(file=file)
-            results.append({
-                "filename": file.filename,
-                "success": True,
-                "data": result.dict()
-            })
-        except HTTPException as e:
-            results.append({
-                "filename": file.filename,
-                "success": False,
-                "error": e.detail
-            })
-        except Exception as e:
-            results.append({
-                "filename": file.filename,
-                "success": False,
-                "error": str(e)
-            })
-    
+    # 以 Semaphore 限制同時處理的檔案數，讓多個上傳在共用引擎中管線化
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def process_one(file: UploadFile) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                # 直接使用 payload dict，跳過 pydantic 模型往返
+                payload = await _do_ocr_upload(file, background_tasks)
+                return {
+                    "filename": file.filename,
+                    "success": True,
+                    "data": payload
+                }
+            except HTTPException as e:
+                return {
+                    "filename": file.filename,
+                    "success": False,
+                    "error": e.detail
+                }
+            except Exception as e:
+                return {
+                    "filename": file.filename,
+                    "success": False,
+                    "error": str(e)
+                }
+
+    results = await asyncio.gather(*(process_one(file) for file in files))
+
     return {
         "success": True,
         "total": len(files),
@@ -404,6 +718,7 @@ async def ocr_batch(
 
 @app.post("/api/ocr/table")
 async def ocr_to_table(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(..., description="上傳圖片或 PDF 檔案"),
 ):
     """
@@ -419,23 +734,26 @@ async def ocr_to_table(
         raise HTTPException(status_code=400, detail=result)
     
     file_ext = result
-    file_id = str(uuid.uuid4())
-    temp_path = UPLOAD_DIR / f"{file_id}{file_ext}"
-    
+    temp_path, digest = await save_upload_streaming(file, file_ext)
+
     try:
-        content = await file.read()
-        with open(temp_path, 'wb') as f:
-            f.write(content)
-        
-        # 執行 OCR
-        if file_ext in ALLOWED_PDF_EXTENSIONS:
-            ocr_results = process_pdf_ocr(str(temp_path))
-        else:
-            ocr_results = process_image_ocr(str(temp_path))
+        # 執行 OCR (相同內容且相同處理路徑的重複上傳直接取用快取結果)
+        file_type = "pdf" if file_ext in ALLOWED_PDF_EXTENSIONS else "image"
+        cache_key = _cache_key(file_type, digest)
+        ocr_results = _cache_get(cache_key)
+        if ocr_results is None:
+            if file_type == "pdf":
+                ocr_results = await process_pdf_ocr(str(temp_path))
+            else:
+                ocr_results = await process_image_ocr(str(temp_path))
+            _cache_put(cache_key, ocr_results)
         
         # 轉換為表格
         csv_content, markdown_table, rows, cols = convert_to_table(ocr_results)
-        
+
+        # 回應送出後才在背景清理暫存檔
+        background_tasks.add_task(temp_path.unlink, missing_ok=True)
+
         return TableResponse(
             success=True,
             csv_content=csv_content,
@@ -443,13 +761,11 @@ async def ocr_to_table(
             row_count=rows,
             col_count=cols
         )
-        
+
     except Exception as e:
         logger.error(f"表格轉換錯誤: {str(e)}")
+        temp_path.unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=f"表格轉換失敗: {str(e)}")
-    finally:
-        if temp_path.exists():
-            temp_path.unlink()
 
 @app.post("/api/convert/table")
 async def convert_text_to_table(
@@ -480,10 +796,6 @@ async def convert_text_to_table(
 
 def convert_to_table(ocr_results: List[Dict], delimiter: str = "auto") -> tuple:
     """將 OCR 結果轉換為表格"""
-    import csv
-    import io
-    import re
-    
     if not ocr_results:
         return "", "", 0, 0
     
@@ -495,11 +807,12 @@ def convert_to_table(ocr_results: List[Dict], delimiter: str = "auto") -> tuple:
     
     # 自動偵測分隔符
     if delimiter == "auto":
-        # 統計各種分隔符出現次數
-        tab_count = sum(line.count('\t') for line in lines)
-        comma_count = sum(line.count(',') for line in lines)
-        space_count = sum(len(re.findall(r'\s{2,}', line)) for line in lines)
-        
+        # 先串接所有行，以單次 C 層掃描統計各種分隔符出現次數
+        all_text = '\n'.join(lines)
+        tab_count = all_text.count('\t')
+        comma_count = all_text.count(',')
+        space_count = len(_RE_MULTISPACE.findall(all_text))
+
         if tab_count > len(lines) * 0.5:
             delimiter = '\t'
         elif comma_count > len(lines) * 0.5:
@@ -517,7 +830,7 @@ def convert_to_table(ocr_results: List[Dict], delimiter: str = "auto") -> tuple:
     for line in lines:
         if delimiter == 'space':
             # 用2個以上空格分割
-            cells = re.split(r'\s{2,}', line.strip())
+            cells = _RE_MULTISPACE.split(line.strip())
         elif delimiter == 'tab':
             cells = line.split('\t')
         elif delimiter == 'comma':
@@ -571,7 +884,7 @@ async def get_supported_formats():
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "success": False,
@@ -583,7 +896,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     logger.error(f"未預期的錯誤: {str(exc)}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "success": False,
@@ -600,16 +913,25 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="PaddleOCR Web Service")
     parser.add_argument("--host", default="0.0.0.0", help="綁定的主機位址")
     parser.add_argument("--port", type=int, default=8000, help="服務埠號")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="工作行程數 (OCR 為 CPU 密集，建議約等於實體核心數)")
     parser.add_argument("--reload", action="store_true", help="開發模式 (自動重載)")
-    
+
     args = parser.parse_args()
-    
+
+    if args.workers > 1:
+        # 每個行程各自持有 OCR 引擎；限制行程內的執行緒數，
+        # 避免 OMP/MKL 在多行程下超額訂閱核心
+        os.environ.setdefault("OMP_NUM_THREADS", "1")
+        os.environ.setdefault("MKL_NUM_THREADS", "1")
+
     logger.info(f"啟動 PaddleOCR 服務於 http://{args.host}:{args.port}")
-    
+
     uvicorn.run(
         "app:app",
         host=args.host,
         port=args.port,
+        workers=args.workers,
         reload=args.reload,
         log_level="info"
     )
@@ -84,7 +84,6 @@ install_system_deps() {
         libxext6 \
         libxrender1 \
         libgomp1 \
-        poppler-utils \
         curl \
         wget \
         git